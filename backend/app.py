@@ -1,21 +1,49 @@
+import hashlib
 import os
-from flask import Flask, request, jsonify, session
-from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+from flask import Flask, Response, request, jsonify, session
+from flask.json.provider import JSONProvider
 from dotenv import load_dotenv
 import base64
 from PIL import Image
 import io
 import google.generativeai as genai
+import httpx
+from cachetools import TTLCache
 from supabase import create_client, Client
 
 # Load environment variables
 load_dotenv()
 
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson's C implementation - noticeably
+    faster than stdlib json for the multi-KB analysis payloads."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
+app.json = OrjsonProvider(app)
+
+# Static wildcard CORS headers set in one after_request hook - the same
+# policy Flask-CORS applied, without its per-request middleware layer
+_CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+}
+
 
-# Enable CORS for development (allow all origins)
-CORS(app, origins="*", allow_headers=["Content-Type", "Authorization"], methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
+@app.after_request
+def _apply_cors(response):
+    response.headers.update(_CORS_HEADERS)
+    return response
 
 # Initialize Supabase client (will be set up later)
 supabase_url = os.getenv('SUPABASE_URL')
@@ -24,16 +52,228 @@ supabase_key = os.getenv('SUPABASE_ANON_KEY')
 # Only create supabase client if credentials are provided
 if supabase_url and supabase_key and supabase_url != 'your_supabase_url_here':
     supabase: Client = create_client(supabase_url, supabase_key)
+
+    # Swap in a keep-alive httpx session so PostgREST calls reuse warm TLS
+    # connections instead of handshaking on every query. Storage uploads
+    # route through storage3's internal client, which doesn't expose its
+    # session for replacement, so they keep the library default.
+    _keepalive_limits = httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60)
+    try:
+        _old_session = supabase.postgrest.session
+        supabase.postgrest.session = httpx.Client(
+            base_url=_old_session.base_url,
+            headers=_old_session.headers,
+            timeout=_old_session.timeout,
+            limits=_keepalive_limits,
+        )
+    except AttributeError:
+        # supabase-py internals moved - keep the default session
+        pass
 else:
     supabase = None
 
+# Optional direct-Postgres pool for the read-heavy GET endpoints. Point
+# SUPABASE_DB_URL at the Supabase pooler (port 6543, pgbouncer transaction
+# mode) to skip the PostgREST HTTP/TLS/JSON layer on every read
+supabase_db_url = os.getenv('SUPABASE_DB_URL')
+if supabase_db_url:
+    from psycopg.rows import dict_row
+    from psycopg_pool import ConnectionPool
+
+    # prepare_threshold=None disables psycopg's automatic named prepared
+    # statements, which break behind pgbouncer in transaction mode
+    db_pool = ConnectionPool(
+        supabase_db_url,
+        min_size=2,
+        max_size=10,
+        kwargs={'row_factory': dict_row, 'prepare_threshold': None}
+    )
+else:
+    db_pool = None
+
 # Initialize Gemini model
 gemini_api_key = os.getenv('GEMINI_API_KEY')
 if not gemini_api_key:
     raise ValueError("GEMINI_API_KEY not found in environment variables")
 
 genai.configure(api_key=gemini_api_key)
-model = genai.GenerativeModel('gemini-1.5-flash')
+
+# Bounded output keeps response latency and analysis row sizes predictable;
+# the config is built once and shared by every request
+_generation_config = genai.GenerationConfig(max_output_tokens=512, temperature=0.4)
+model = genai.GenerativeModel('gemini-1.5-flash', generation_config=_generation_config)
+
+DEFAULT_PROMPT = 'Describe the contents of this image in detail. Be specific about objects, people, colors, and activities you see.'
+
+# In-process cache of (image hash, prompt) -> analysis text so exact
+# duplicate uploads skip the Gemini call entirely
+_duplicate_cache = {}
+_DUPLICATE_CACHE_MAX = 1024
+
+# Short-lived cache of analysis rows - polling frontends hit
+# /analysis/<image_id> repeatedly for results that rarely change
+_analysis_cache = TTLCache(maxsize=10_000, ttl=60)
+
+# Background workers for the multi-second Gemini calls, so /upload-image
+# can return 202 immediately instead of holding a worker for the duration
+_gemini_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='gemini')
+
+# Pool for short-lived concurrent I/O (storage uploads alongside DB
+# inserts, batch Gemini fan-out). Under the gevent worker these threads
+# are greenlets, so the blocking calls inside yield cooperatively
+_io_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='io')
+
+
+def _decode_data_url(image_data):
+    """Extract and decode the base64 payload of a data URL. The comma
+    separator sits within the first few dozen header characters, so the
+    bounded find() never scans the multi-MB payload (unlike split(','))."""
+    comma = image_data.find(',', 0, 64)
+    payload = image_data[comma + 1:] if comma != -1 else image_data
+    return base64.b64decode(payload)
+
+
+def _prepare_image(image_bytes, custom_prompt):
+    """Downscale and re-encode an uploaded image, returning the compact
+    bytes, the Gemini inline part, the content-addressed storage path,
+    and the duplicate-cache key."""
+    # Downscale and re-encode before sending anywhere - Gemini tiles
+    # images at 768px, so full-resolution phone photos only cost extra
+    # bandwidth and vision tokens
+    img = Image.open(io.BytesIO(image_bytes))
+
+    # For JPEGs, draft mode lets libjpeg decode at 1/2-1/8 DCT scale
+    # straight to roughly the target size - much faster and far less RAM
+    # than a full-resolution decode
+    img.draft('RGB', (1024, 1024))
+    img.load()
+
+    img.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    img.convert('RGB').save(buf, 'JPEG', quality=85, optimize=True)
+    image_bytes = buf.getvalue()
+
+    # Content-addressed storage path: identical images (re-encoding is
+    # deterministic) land on the same object, so the upsert upload is a
+    # no-op for duplicates regardless of who uploads them
+    digest = hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+    storage_path = f"sha/{digest[:2]}/{digest}.jpg"
+    cache_key = (digest, custom_prompt)
+
+    return image_bytes, {'mime_type': 'image/jpeg', 'data': image_bytes}, storage_path, cache_key
+
+
+def _remember_analysis(cache_key, analysis_text):
+    """Store an analysis in the duplicate-upload cache (bounded FIFO)."""
+    if cache_key not in _duplicate_cache:
+        if len(_duplicate_cache) >= _DUPLICATE_CACHE_MAX:
+            _duplicate_cache.pop(next(iter(_duplicate_cache)))
+        _duplicate_cache[cache_key] = analysis_text
+
+
+def _run_gemini(image_part, custom_prompt, cache_key):
+    """Run the Gemini analysis (or return a cached duplicate result)."""
+    analysis_text = _duplicate_cache.get(cache_key)
+    if analysis_text is not None:
+        return analysis_text
+
+    response = model.generate_content([custom_prompt, image_part])
+
+    analysis_text = response.text
+    _remember_analysis(cache_key, analysis_text)
+    return analysis_text
+
+
+def _find_existing_analysis(storage_path, custom_prompt):
+    """Return a stored analysis for the same content-addressed image and
+    prompt, if one exists - dedupes Gemini calls across restarts and
+    across users, not just while the in-process cache is warm."""
+    result = supabase.table('images').select(
+        'analysis(analysis_text, custom_prompt)'
+    ).eq('storage_path', storage_path).eq('status', 'completed').execute()
+
+    for row in result.data or []:
+        for analysis in row.get('analysis') or []:
+            if analysis.get('custom_prompt') == custom_prompt:
+                return analysis['analysis_text']
+
+    return None
+
+
+def _process_image_with_gemini(image_id, user_id, image_part, custom_prompt, cache_key, storage_path):
+    """Background task: analyze the image and persist the result."""
+    try:
+        analysis_text = _duplicate_cache.get(cache_key)
+        if analysis_text is None:
+            analysis_text = _find_existing_analysis(storage_path, custom_prompt)
+            if analysis_text is not None:
+                _remember_analysis(cache_key, analysis_text)
+
+        if analysis_text is None:
+            analysis_text = _run_gemini(image_part, custom_prompt, cache_key)
+
+        supabase.rpc('complete_image_analysis', {
+            'img_id': image_id,
+            'uid': user_id,
+            'prompt': custom_prompt,
+            'analysis': analysis_text
+        }).execute()
+    except Exception as ai_error:
+        supabase.table('images').update({
+            'status': 'failed',
+            'error_message': str(ai_error)
+        }).eq('id', image_id).execute()
+
+
+def _process_image_batch(items):
+    """Background task: analyze a batch of images concurrently and persist
+    every result with one round-trip per table."""
+    futures = [
+        _io_executor.submit(_run_gemini, item['image_part'], item['custom_prompt'], item['cache_key'])
+        for item in items
+    ]
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as gemini_error:
+            results.append(gemini_error)
+
+    analysis_rows = []
+    completed_ids = []
+    for item, result in zip(items, results):
+        if isinstance(result, Exception):
+            supabase.table('images').update({
+                'status': 'failed',
+                'error_message': str(result)
+            }).eq('id', item['image_id']).execute()
+        else:
+            analysis_rows.append({
+                'image_id': item['image_id'],
+                'user_id': item['user_id'],
+                'analysis_text': result,
+                'custom_prompt': item['custom_prompt'],
+                'status': 'completed',
+                'is_edited': False
+            })
+            completed_ids.append(item['image_id'])
+
+    if analysis_rows:
+        try:
+            # One batched insert and one batched status update for the whole
+            # batch instead of 2 round-trips per image
+            supabase.table('analysis').insert(analysis_rows).execute()
+            supabase.table('images').update({
+                'status': 'completed'
+            }).in_('id', completed_ids).execute()
+        except Exception as db_error:
+            # Mark the batch failed rather than stranding it in
+            # 'processing' while clients poll /analysis into their timeout
+            supabase.table('images').update({
+                'status': 'failed',
+                'error_message': str(db_error)
+            }).in_('id', completed_ids).execute()
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -54,118 +294,334 @@ def test_gemini():
             "message": f"Gemini integration failed: {str(e)}"
         }), 500
 
-@app.route('/upload-image', methods=['POST'])
+def _parse_upload_request():
+    """Extract (image_bytes, user_id, custom_prompt) from a multipart or
+    JSON upload request. Returns (None, None, None) when required fields
+    are missing."""
+    if request.files:
+        # Multipart fast path: raw binary straight off the request
+        # stream - no base64 payload and no intermediate string copies
+        image_file = request.files.get('image')
+        user_id = request.form.get('user_id')
+        custom_prompt = request.form.get('custom_prompt', DEFAULT_PROMPT)
+
+        if image_file is None or not user_id:
+            return None, None, None
+
+        return image_file.read(), user_id, custom_prompt
+
+    data = request.get_json()
+
+    if 'image' not in data or 'user_id' not in data:
+        return None, None, None
+
+    # Decode base64 once and reuse the bytes for both storage and Gemini
+    image_bytes = _decode_data_url(data['image'])
+    return image_bytes, data['user_id'], data.get('custom_prompt', DEFAULT_PROMPT)
+
+
 def upload_image():
+    """Supabase-backed /upload-image (bound at import time)."""
     try:
-        data = request.get_json()
-        
-        if 'image' not in data or 'user_id' not in data:
+        image_bytes, user_id, custom_prompt = _parse_upload_request()
+
+        if image_bytes is None:
             return jsonify({"error": "Missing image or user_id"}), 400
-        
-        image_data = data['image']
-        user_id = data['user_id']
-        custom_prompt = data.get('custom_prompt', 'Describe the contents of this image in detail. Be specific about objects, people, colors, and activities you see.')
-        
-        # For now, simulate storing image (will implement Supabase later)
-        if supabase:
-            # Store image in Supabase
-            image_record = supabase.table('images').insert({
-                'user_id': user_id,
-                'image_data': image_data,
-                'status': 'processing'
-            }).execute()
-            
-            if not image_record.data:
-                return jsonify({"error": "Failed to store image"}), 500
-            
-            image_id = image_record.data[0]['id']
-        else:
-            # Mock image ID for testing without Supabase
-            image_id = 1
-        
-        # Process image with Gemini
+
+        image_bytes, image_part, storage_path, cache_key = _prepare_image(
+            image_bytes, custom_prompt
+        )
+
+        # Upload binary bytes to Supabase Storage (only the object path
+        # goes in the row; upsert makes duplicate content a cheap no-op)
+        # concurrently with the image insert - both are independent
+        # network I/O, so latency is max() instead of sum()
+        upload_future = _io_executor.submit(
+            supabase.storage.from_('images').upload,
+            storage_path, image_bytes,
+            {'content-type': 'image/jpeg', 'upsert': 'true'}
+        )
+
+        image_record = supabase.table('images').insert({
+            'user_id': user_id,
+            'storage_path': storage_path,
+            'status': 'processing'
+        }).execute()
+
+        # Surface storage errors before acknowledging the upload
+        upload_future.result()
+
+        image_id = image_record.data[0]['id'] if image_record.data else None
+
+        if image_id is None:
+            return jsonify({"error": "Failed to store image"}), 500
+
+        # Hand the multi-second Gemini call to a background worker; the
+        # frontend polls /analysis/<image_id> for the result
+        _gemini_executor.submit(
+            _process_image_with_gemini,
+            image_id, user_id, image_part, custom_prompt, cache_key, storage_path
+        )
+
+        return jsonify({
+            "image_id": image_id,
+            "status": "processing"
+        }), 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def upload_image_mock():
+    """Mock /upload-image for local testing without Supabase - analyzes
+    inline and returns the completed result directly."""
+    try:
+        image_bytes, user_id, custom_prompt = _parse_upload_request()
+
+        if image_bytes is None:
+            return jsonify({"error": "Missing image or user_id"}), 400
+
+        image_bytes, image_part, _storage_path, cache_key = _prepare_image(
+            image_bytes, custom_prompt
+        )
+
         try:
-            # Decode base64 image
-            image_bytes = base64.b64decode(image_data.split(',')[1])
-            
-            # Convert to PIL Image
-            img = Image.open(io.BytesIO(image_bytes))
-            
-            # Generate analysis using Gemini with custom prompt
-            response = model.generate_content([custom_prompt, img])
-            analysis_text = response.text
-            
-            # Store analysis results (if Supabase is configured)
-            if supabase:
-                analysis_record = supabase.table('analysis').insert({
-                    'image_id': image_id,
-                    'user_id': user_id,
-                    'analysis_text': analysis_text,
-                    'custom_prompt': custom_prompt,
-                    'status': 'completed',
-                    'is_edited': False
-                }).execute()
-                
-                # Update image status
-                supabase.table('images').update({
-                    'status': 'completed'
-                }).eq('id', image_id).execute()
-            
-            return jsonify({
-                "image_id": image_id,
-                "analysis": analysis_text,
-                "analysis_id": analysis_record.data[0]['id'] if supabase and analysis_record.data else None,
-                "status": "completed"
-            })
-            
+            analysis_text = _run_gemini(image_part, custom_prompt, cache_key)
         except Exception as ai_error:
-            # Update image status to failed (if Supabase is configured)
-            if supabase:
-                supabase.table('images').update({
-                    'status': 'failed',
-                    'error_message': str(ai_error)
-                }).eq('id', image_id).execute()
-            
             return jsonify({"error": f"AI analysis failed: {str(ai_error)}"}), 500
-            
+
+        return jsonify({
+            "image_id": 1,
+            "analysis": analysis_text,
+            "analysis_id": None,
+            "status": "completed"
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def upload_image_stream():
+    """Stream Gemini tokens over server-sent events as they arrive, then
+    persist the aggregated analysis. Time-to-first-token replaces
+    time-to-last-token for perceived latency."""
+    try:
+        image_bytes, user_id, custom_prompt = _parse_upload_request()
+
+        if image_bytes is None:
+            return jsonify({"error": "Missing image or user_id"}), 400
+
+        image_bytes, image_part, storage_path, cache_key = _prepare_image(
+            image_bytes, custom_prompt
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    def generate():
+        def event(payload):
+            return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+        try:
+            supabase.storage.from_('images').upload(
+                storage_path, image_bytes,
+                {'content-type': 'image/jpeg', 'upsert': 'true'}
+            )
+
+            analysis_text = _duplicate_cache.get(cache_key)
+            if analysis_text is None:
+                analysis_text = _find_existing_analysis(storage_path, custom_prompt)
+                if analysis_text is not None:
+                    _remember_analysis(cache_key, analysis_text)
+
+            if analysis_text is not None:
+                # Exact duplicate - emit the cached analysis as one delta
+                yield event({"delta": analysis_text})
+            else:
+                stream = model.generate_content([custom_prompt, image_part], stream=True)
+
+                chunks = []
+                for chunk in stream:
+                    if chunk.text:
+                        chunks.append(chunk.text)
+                        yield event({"delta": chunk.text})
+
+                analysis_text = ''.join(chunks)
+                _remember_analysis(cache_key, analysis_text)
+
+            rpc_result = supabase.rpc('upsert_image_with_analysis', {
+                'uid': user_id,
+                'path': storage_path,
+                'prompt': custom_prompt,
+                'analysis': analysis_text
+            }).execute()
+
+            yield event({
+                "image_id": rpc_result.data[0]['image_id'] if rpc_result.data else None,
+                "analysis_id": rpc_result.data[0]['analysis_id'] if rpc_result.data else None,
+                "status": "completed"
+            })
+        except Exception as e:
+            yield event({"error": str(e)})
+
+    return Response(generate(), mimetype='text/event-stream')
+
+
+def upload_images():
+    try:
+        data = request.get_json()
+
+        if 'images' not in data or 'user_id' not in data:
+            return jsonify({"error": "Missing images or user_id"}), 400
+
+        images = data['images']
+        user_id = data['user_id']
+        custom_prompt = data.get('custom_prompt', DEFAULT_PROMPT)
+
+        if not isinstance(images, list) or not images:
+            return jsonify({"error": "images must be a non-empty list"}), 400
+
+        items = []
+        for image_data in images:
+            image_bytes = _decode_data_url(image_data)
+            image_bytes, image_part, storage_path, cache_key = _prepare_image(
+                image_bytes, custom_prompt
+            )
+            items.append({
+                'user_id': user_id,
+                'custom_prompt': custom_prompt,
+                'storage_path': storage_path,
+                'image_bytes': image_bytes,
+                'image_part': image_part,
+                'cache_key': cache_key
+            })
+
+        # Storage uploads run concurrently with the batched insert below
+        upload_futures = [
+            _io_executor.submit(
+                supabase.storage.from_('images').upload,
+                item['storage_path'], item['image_bytes'],
+                {'content-type': 'image/jpeg', 'upsert': 'true'}
+            )
+            for item in items
+        ]
+
+        # One batched insert returns every image ID in a single
+        # round-trip instead of one insert per image
+        image_records = supabase.table('images').insert([
+            {
+                'user_id': user_id,
+                'storage_path': item['storage_path'],
+                'status': 'processing'
+            }
+            for item in items
+        ]).execute()
+
+        # Surface storage errors before acknowledging the batch
+        for upload_future in upload_futures:
+            upload_future.result()
+
+        if not image_records.data or len(image_records.data) != len(items):
+            return jsonify({"error": "Failed to store images"}), 500
+
+        for item, record in zip(items, image_records.data):
+            item['image_id'] = record['id']
+
+        # One background task analyzes the whole batch concurrently and
+        # persists all results in batched writes
+        _gemini_executor.submit(_process_image_batch, items)
+
+        return jsonify({
+            "image_ids": [item['image_id'] for item in items],
+            "status": "processing"
+        }), 202
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/analysis/<int:image_id>', methods=['GET'])
+
 def get_analysis(image_id):
     try:
-        if not supabase:
-            return jsonify({"error": "Supabase not configured"}), 500
-            
+        cached_row = _analysis_cache.get(image_id)
+        if cached_row is not None:
+            return jsonify(cached_row)
+
         result = supabase.table('analysis').select('*').eq('image_id', image_id).execute()
-        
+
         if not result.data:
             return jsonify({"error": "Analysis not found"}), 404
-        
+
+        _analysis_cache[image_id] = result.data[0]
         return jsonify(result.data[0])
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/user-images/<user_id>', methods=['GET'])
+def get_analysis_pooled(image_id):
+    """Pooled direct-Postgres variant of get_analysis (bound at import
+    time when SUPABASE_DB_URL is set)."""
+    try:
+        cached_row = _analysis_cache.get(image_id)
+        if cached_row is not None:
+            return jsonify(cached_row)
+
+        with db_pool.connection() as conn:
+            row = conn.execute(
+                'SELECT * FROM analysis WHERE image_id = %s', [image_id]
+            ).fetchone()
+
+        if row is None:
+            return jsonify({"error": "Analysis not found"}), 404
+
+        _analysis_cache[image_id] = row
+        return jsonify(row)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 def get_user_images(user_id):
     try:
-        if not supabase:
-            return jsonify({"error": "Supabase not configured"}), 500
-            
-        result = supabase.table('images').select('*, analysis(*)').eq('user_id', user_id).order('created_at', desc=True).execute()
+        # Hot metadata only - image binaries live in Storage, so this
+        # response stays a few hundred bytes per row instead of megabytes
+        result = supabase.table('images').select(
+            'id, user_id, status, created_at, storage_path, analysis(*)'
+        ).eq('user_id', user_id).order('created_at', desc=True).execute()
         
         return jsonify(result.data)
-        
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def get_user_images_pooled(user_id):
+    """Pooled direct-Postgres variant of get_user_images (bound at import
+    time when SUPABASE_DB_URL is set)."""
+    try:
+        with db_pool.connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT i.id, i.user_id, i.status, i.created_at, i.storage_path,
+                       COALESCE(
+                           json_agg(a.*) FILTER (WHERE a.id IS NOT NULL),
+                           '[]'
+                       ) AS analysis
+                FROM images i
+                LEFT JOIN analysis a ON a.image_id = i.id
+                WHERE i.user_id = %s
+                GROUP BY i.id
+                ORDER BY i.created_at DESC
+                """,
+                [user_id]
+            ).fetchall()
+
+        return jsonify(rows)
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/update-analysis/<int:analysis_id>', methods=['PUT'])
+
 def update_analysis(analysis_id):
     try:
-        if not supabase:
-            return jsonify({"error": "Supabase not configured"}), 500
-            
         data = request.get_json()
         
         if 'analysis_text' not in data or 'user_id' not in data:
@@ -175,7 +631,7 @@ def update_analysis(analysis_id):
         user_id = data['user_id']
         
         # Verify user owns this analysis
-        result = supabase.table('analysis').select('user_id').eq('id', analysis_id).execute()
+        result = supabase.table('analysis').select('user_id, image_id').eq('id', analysis_id).execute()
         
         if not result.data:
             return jsonify({"error": "Analysis not found"}), 404
@@ -191,14 +647,48 @@ def update_analysis(analysis_id):
         
         if not update_result.data:
             return jsonify({"error": "Failed to update analysis"}), 500
-        
+
+        # Drop the stale cached row so polls see the edited text
+        _analysis_cache.pop(result.data[0]['image_id'], None)
+
         return jsonify({
             "message": "Analysis updated successfully",
             "analysis_id": analysis_id
         })
-        
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
+def _supabase_not_configured(*args, **kwargs):
+    """Stand-in view bound at import time when Supabase isn't configured."""
+    return jsonify({"error": "Supabase not configured"}), 500
+
+
+# Bind each route to its specialized implementation once at import time -
+# `supabase` is fixed after startup, so none of the views re-check it per
+# request
+if supabase:
+    app.add_url_rule('/upload-image', view_func=upload_image, methods=['POST'])
+    app.add_url_rule('/upload-image-stream', view_func=upload_image_stream, methods=['POST'])
+    app.add_url_rule('/upload-images', view_func=upload_images, methods=['POST'])
+    app.add_url_rule('/analysis/<int:image_id>', endpoint='get_analysis',
+                     view_func=get_analysis_pooled if db_pool else get_analysis, methods=['GET'])
+    app.add_url_rule('/user-images/<user_id>', endpoint='get_user_images',
+                     view_func=get_user_images_pooled if db_pool else get_user_images, methods=['GET'])
+    app.add_url_rule('/update-analysis/<int:analysis_id>', view_func=update_analysis, methods=['PUT'])
+else:
+    app.add_url_rule('/upload-image', view_func=upload_image_mock, methods=['POST'])
+    for _rule, _endpoint, _methods in (
+        ('/upload-image-stream', 'upload_image_stream', ['POST']),
+        ('/upload-images', 'upload_images', ['POST']),
+        ('/analysis/<int:image_id>', 'get_analysis', ['GET']),
+        ('/user-images/<user_id>', 'get_user_images', ['GET']),
+        ('/update-analysis/<int:analysis_id>', 'update_analysis', ['PUT']),
+    ):
+        app.add_url_rule(_rule, endpoint=_endpoint, view_func=_supabase_not_configured, methods=_methods)
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Local development only - production runs under Gunicorn:
+    #   gunicorn -c gunicorn.conf.py app:app
+    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,21 @@
+"""Gunicorn configuration for the Flask backend.
+
+Run with: gunicorn -c gunicorn.conf.py app:app
+
+gevent workers turn the blocking Supabase/Gemini I/O into cooperative
+greenlet switches, so each worker multiplexes up to worker_connections
+in-flight requests instead of serializing them.
+"""
+import multiprocessing
+
+from gevent import monkey
+
+# Patch the stdlib before anything opens sockets so every blocking
+# network call yields to other greenlets
+monkey.patch_all()
+
+bind = '0.0.0.0:5000'
+workers = 2 * multiprocessing.cpu_count() + 1
+worker_class = 'gevent'
+worker_connections = 1000
+keepalive = 65
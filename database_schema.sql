@@ -14,11 +14,18 @@ CREATE TABLE public.user_profiles (
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Create storage bucket for image binaries
+INSERT INTO storage.buckets (id, name)
+VALUES ('images', 'images')
+ON CONFLICT (id) DO NOTHING;
+
 -- Create images table
 CREATE TABLE public.images (
     id BIGSERIAL PRIMARY KEY,
     user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
-    image_data TEXT NOT NULL, -- Base64 encoded image
+    storage_path TEXT, -- Object path in the 'images' storage bucket
+    -- Migration for databases created before storage_path existed:
+    --   ALTER TABLE public.images DROP COLUMN image_data, ADD COLUMN storage_path TEXT;
     original_filename TEXT,
     mime_type TEXT DEFAULT 'image/jpeg',
     file_size INTEGER,
@@ -34,6 +41,8 @@ CREATE TABLE public.analysis (
     image_id BIGINT NOT NULL REFERENCES public.images(id) ON DELETE CASCADE,
     user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
     analysis_text TEXT NOT NULL,
+    custom_prompt TEXT,
+    is_edited BOOLEAN DEFAULT FALSE,
     confidence_score NUMERIC(3,2), -- 0.00 to 1.00
     model_version TEXT DEFAULT 'gemini-1.5-flash',
     processing_time_ms INTEGER,
@@ -63,11 +72,14 @@ CREATE TABLE public.chat_messages (
 );
 
 -- Create indexes for better performance
-CREATE INDEX idx_images_user_id ON public.images(user_id);
+-- Covering index for GET /user-images: filter + sort are satisfied by the
+-- key columns and status comes from the INCLUDE list, so the planner can
+-- use an index-only scan without touching the heap
+CREATE INDEX idx_images_user_created ON public.images(user_id, created_at DESC) INCLUDE (status);
 CREATE INDEX idx_images_status ON public.images(status);
-CREATE INDEX idx_images_created_at ON public.images(created_at DESC);
 
-CREATE INDEX idx_analysis_image_id ON public.analysis(image_id);
+-- Covering index for GET /analysis/<image_id>
+CREATE INDEX idx_analysis_image_id ON public.analysis(image_id) INCLUDE (analysis_text, is_edited);
 CREATE INDEX idx_analysis_user_id ON public.analysis(user_id);
 CREATE INDEX idx_analysis_created_at ON public.analysis(created_at DESC);
 
@@ -145,6 +157,53 @@ CREATE POLICY "Users can insert own chat messages" ON public.chat_messages
         )
     );
 
+-- Write an image row plus its analysis and the completed status in one
+-- atomic call (replaces three serial PostgREST round-trips on upload)
+CREATE OR REPLACE FUNCTION public.upsert_image_with_analysis(
+    uid UUID,
+    path TEXT,
+    prompt TEXT,
+    analysis TEXT
+)
+RETURNS TABLE(image_id BIGINT, analysis_id BIGINT) AS $$
+DECLARE
+    new_image_id BIGINT;
+    new_analysis_id BIGINT;
+BEGIN
+    INSERT INTO public.images (user_id, storage_path, status)
+    VALUES (uid, path, 'completed')
+    RETURNING id INTO new_image_id;
+
+    INSERT INTO public.analysis (image_id, user_id, analysis_text, custom_prompt, status, is_edited)
+    VALUES (new_image_id, uid, analysis, prompt, 'completed', FALSE)
+    RETURNING id INTO new_analysis_id;
+
+    RETURN QUERY SELECT new_image_id, new_analysis_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Persist a background worker's analysis and mark the image completed
+-- in one atomic call
+CREATE OR REPLACE FUNCTION public.complete_image_analysis(
+    img_id BIGINT,
+    uid UUID,
+    prompt TEXT,
+    analysis TEXT
+)
+RETURNS BIGINT AS $$
+DECLARE
+    new_analysis_id BIGINT;
+BEGIN
+    INSERT INTO public.analysis (image_id, user_id, analysis_text, custom_prompt, status, is_edited)
+    VALUES (img_id, uid, analysis, prompt, 'completed', FALSE)
+    RETURNING id INTO new_analysis_id;
+
+    UPDATE public.images SET status = 'completed' WHERE id = img_id;
+
+    RETURN new_analysis_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
 -- Create functions for automatic timestamp updates
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
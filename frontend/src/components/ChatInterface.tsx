@@ -113,16 +113,43 @@ export default function ChatInterface({ user }: ChatInterfaceProps) {
 
       const response = await axios.post(`${apiUrl}/upload-image`, payload)
 
+      let analysisText = response.data.analysis
+      let analysisId = response.data.analysis_id
+
+      if (response.data.status === 'processing') {
+        // Backend accepted the upload and queued the analysis - poll the
+        // existing /analysis endpoint until the result is ready
+        const imageId = response.data.image_id
+        const maxAttempts = 40
+
+        for (let attempt = 0; attempt < maxAttempts; attempt++) {
+          await new Promise(resolve => setTimeout(resolve, 1500))
+
+          try {
+            const analysisResponse = await axios.get(`${apiUrl}/analysis/${imageId}`)
+            analysisText = analysisResponse.data.analysis_text
+            analysisId = analysisResponse.data.id
+            break
+          } catch {
+            // 404 until the background analysis lands - keep polling
+          }
+        }
+
+        if (analysisText === undefined) {
+          throw new Error('Analysis timed out - please try again')
+        }
+      }
+
       // Replace loading message with actual analysis
-      setMessages(prev => 
-        prev.map(msg => 
-          msg.id === loadingMessageId 
+      setMessages(prev =>
+        prev.map(msg =>
+          msg.id === loadingMessageId
             ? {
                 ...msg,
-                content: response.data.analysis,
-                originalContent: response.data.analysis,
+                content: analysisText,
+                originalContent: analysisText,
                 loading: false,
-                analysisId: response.data.analysis_id,
+                analysisId: analysisId,
               }
             : msg
         )
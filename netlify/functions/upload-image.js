@@ -1,6 +1,44 @@
+const crypto = require('crypto');
 const { createClient } = require('@supabase/supabase-js');
 const { GoogleGenerativeAI } = require('@google/generative-ai');
 
+// Module-scope singletons so warm containers reuse the Supabase client
+// (and its HTTPS connection pool) and the Gemini model across invocations
+// instead of rebuilding them on every request
+let _supabase = null;
+let _model = null;
+
+function getSupabase() {
+  if (_supabase === null) {
+    const supabaseUrl = process.env.SUPABASE_URL || process.env.NEXT_PUBLIC_SUPABASE_URL;
+    const supabaseKey = process.env.SUPABASE_ANON_KEY || process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY;
+
+    if (!supabaseUrl || !supabaseKey) {
+      console.error('Missing Supabase configuration:', { supabaseUrl: !!supabaseUrl, supabaseKey: !!supabaseKey });
+      return null;
+    }
+
+    _supabase = createClient(supabaseUrl, supabaseKey);
+  }
+  return _supabase;
+}
+
+function getModel() {
+  if (_model === null) {
+    const genAI = new GoogleGenerativeAI(process.env.GEMINI_API_KEY);
+    // Bounded output keeps response latency and analysis row sizes
+    // predictable; the config object is built once with the model
+    _model = genAI.getGenerativeModel({
+      model: 'gemini-1.5-flash',
+      generationConfig: {
+        maxOutputTokens: 512,
+        temperature: 0.4,
+      },
+    });
+  }
+  return _model;
+}
+
 exports.handler = async (event, context) => {
   // Handle CORS preflight requests
   if (event.httpMethod === 'OPTIONS') {
@@ -51,79 +89,53 @@ exports.handler = async (event, context) => {
       customPrompt: customPrompt?.substring(0, 50) + '...'
     });
     
-    // Initialize Supabase client
-    console.log('Creating Supabase client...');
-    console.log('Environment variables available:', {
-      SUPABASE_URL: !!process.env.SUPABASE_URL,
-      SUPABASE_ANON_KEY: !!process.env.SUPABASE_ANON_KEY,
-      GEMINI_API_KEY: !!process.env.GEMINI_API_KEY,
-      NEXT_PUBLIC_SUPABASE_URL: !!process.env.NEXT_PUBLIC_SUPABASE_URL,
-      NEXT_PUBLIC_SUPABASE_ANON_KEY: !!process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY
-    });
-    
-    const supabaseUrl = process.env.SUPABASE_URL || process.env.NEXT_PUBLIC_SUPABASE_URL;
-    const supabaseKey = process.env.SUPABASE_ANON_KEY || process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY;
-    
-    if (!supabaseUrl || !supabaseKey) {
-      console.error('Missing Supabase configuration:', { supabaseUrl: !!supabaseUrl, supabaseKey: !!supabaseKey });
+    // Reuse the shared Supabase and Gemini clients
+    const supabase = getSupabase();
+
+    if (!supabase) {
       return {
         statusCode: 500,
         headers: {
           'Access-Control-Allow-Origin': '*',
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ 
-          error: 'Supabase configuration missing',
-          debug: {
-            hasUrl: !!supabaseUrl,
-            hasKey: !!supabaseKey
-          }
-        })
+        body: JSON.stringify({ error: 'Supabase configuration missing' })
       };
     }
-    
-    const supabase = createClient(supabaseUrl, supabaseKey);
-    
-    // Initialize Gemini AI
-    console.log('Creating Gemini AI client...');
-    const genAI = new GoogleGenerativeAI(process.env.GEMINI_API_KEY);
-    const model = genAI.getGenerativeModel({ model: 'gemini-1.5-flash' });
-    
-    // Store image in Supabase
-    console.log('Storing image in database...');
-    console.log('Supabase client type:', typeof supabase);
-    console.log('Supabase client methods:', Object.getOwnPropertyNames(supabase));
-    
-    const { data: imageRecord, error: imageError } = await supabase
+
+    const model = getModel();
+    
+    // Locate the data-URL comma once - only the short header is scanned,
+    // never the multi-MB base64 payload
+    const commaIdx = imageData.indexOf(',');
+    const base64Data = imageData.slice(commaIdx + 1);
+    const header = imageData.slice(0, commaIdx === -1 ? 0 : commaIdx);
+    const mimeType = header.slice(header.indexOf(':') + 1).split(';')[0] || 'image/jpeg';
+    const imageBytes = Buffer.from(base64Data, 'base64');
+
+    // Content-addressed storage path: identical uploads land on the same
+    // object, so the upsert below is a cheap no-op for duplicates
+    const digest = crypto.createHash('blake2b512').update(imageBytes).digest('hex').slice(0, 32);
+    const storagePath = `sha/${digest.slice(0, 2)}/${digest}.jpg`;
+    console.log('Uploading image to storage:', storagePath);
+    const { error: storageError } = await supabase.storage
       .from('images')
-      .insert({
-        user_id: userId,
-        image_data: imageData,
-        status: 'processing'
-      })
-      .select()
-      .single();
-    
-    if (imageError || !imageRecord) {
-      console.error('Failed to store image:', imageError);
+      .upload(storagePath, imageBytes, { contentType: mimeType, upsert: true });
+
+    if (storageError) {
+      console.error('Failed to upload image to storage:', storageError);
       return {
         statusCode: 500,
         headers: {
           'Access-Control-Allow-Origin': '*',
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ error: 'Failed to store image', details: imageError })
+        body: JSON.stringify({ error: 'Failed to upload image to storage', details: storageError })
       };
     }
-    
-    console.log('Image stored with ID:', imageRecord.id);
-    const imageId = imageRecord.id;
-    
-    // Convert base64 to proper format for Gemini
+
+    // Reuse the already-extracted base64 payload for Gemini
     console.log('Processing image for AI analysis...');
-    const base64Data = imageData.split(',')[1];
-    const mimeType = imageData.split(';')[0].split(':')[1];
-    
     const imagePart = {
       inlineData: {
         data: base64Data,
@@ -131,38 +143,55 @@ exports.handler = async (event, context) => {
       },
     };
     
-    // Generate analysis using Gemini
-    console.log('Calling Gemini AI...');
-    const result = await model.generateContent([customPrompt, imagePart]);
-    const analysisText = result.response.text();
-    console.log('AI analysis completed, text length:', analysisText.length);
-    
-    // Store analysis results
-    console.log('Storing analysis results...');
-    const { data: analysisRecord, error: analysisError } = await supabase
-      .from('analysis')
-      .insert({
-        image_id: imageId,
-        user_id: userId,
-        analysis_text: analysisText,
-        custom_prompt: customPrompt,
-        status: 'completed',
-        is_edited: false
-      })
-      .select()
-      .single();
-    
-    if (analysisError) {
-      console.error('Failed to store analysis:', analysisError);
-    }
-    
-    // Update image status
-    console.log('Updating image status to completed...');
-    await supabase
+    // Same content + prompt analyzed before? Reuse it and skip Gemini
+    const { data: existingRows } = await supabase
       .from('images')
-      .update({ status: 'completed' })
-      .eq('id', imageId);
+      .select('analysis(analysis_text, custom_prompt)')
+      .eq('storage_path', storagePath)
+      .eq('status', 'completed');
+
+    let analysisText = null;
+    for (const row of existingRows || []) {
+      const match = (row.analysis || []).find(a => a.custom_prompt === customPrompt);
+      if (match) {
+        analysisText = match.analysis_text;
+        break;
+      }
+    }
+
+    if (analysisText === null) {
+      // Generate analysis using Gemini
+      console.log('Calling Gemini AI...');
+      const result = await model.generateContent([customPrompt, imagePart]);
+      analysisText = result.response.text();
+      console.log('AI analysis completed, text length:', analysisText.length);
+    } else {
+      console.log('Reusing stored analysis for duplicate image');
+    }
     
+    // One RPC writes the image row, the analysis row, and the completed
+    // status atomically - a single DB round-trip instead of three
+    console.log('Storing image and analysis via RPC...');
+    const { data: rpcResult, error: rpcError } = await supabase
+      .rpc('upsert_image_with_analysis', {
+        uid: userId,
+        path: storagePath,
+        prompt: customPrompt,
+        analysis: analysisText
+      });
+
+    if (rpcError || !rpcResult || !rpcResult.length) {
+      console.error('Failed to store image and analysis:', rpcError);
+      return {
+        statusCode: 500,
+        headers: {
+          'Access-Control-Allow-Origin': '*',
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ error: 'Failed to store image', details: rpcError })
+      };
+    }
+
     console.log('Function completed successfully');
     return {
       statusCode: 200,
@@ -171,9 +200,9 @@ exports.handler = async (event, context) => {
         'Content-Type': 'application/json',
       },
       body: JSON.stringify({
-        image_id: imageId,
+        image_id: rpcResult[0].image_id,
         analysis: analysisText,
-        analysis_id: analysisRecord?.id || null,
+        analysis_id: rpcResult[0].analysis_id,
         status: 'completed'
       })
     };
@@ -12,7 +12,7 @@ export interface User {
 export interface Image {
   id: number;
   user_id: string;
-  image_data: string;
+  storage_path: string;
   original_filename?: string;
   mime_type: string;
   file_size?: number;